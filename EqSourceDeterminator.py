@@ -12,21 +12,335 @@ at sh.yogaswara@gmail.com
 
 [LIBRARIES]
 geopandas
+numba
 numpy
+pyogrio
 shapely
 
 [CHANGELOG 1/2024]
 - New Release
+
+[CHANGELOG 8/2026]
+- Cache shapefile reads so batch processing only parse each file once
+- Replace planar degree distance with haversine over densified fault
+  vertices, compiled with numba
+- Add run for single events plus batch and process_batch for many
+  events at once
+- Optional binary cache of the fault arrays for fast startup
 '''
+import functools
+import math
+import os
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
 import geopandas as gpd
 import numpy as np
+import pandas as pd
+import pyogrio
+import shapely
 
+from numba import njit, prange
 from shapely.geometry import Point
 
+EARTH_RADIUS_KM = 6371.0
+
+
+@functools.lru_cache(maxsize=8)
+def _load_geom(url_geometry, to_crs=None):
+    '''
+    read shapefile or geoJSON from url_geometry and keep the result in
+    memory so repeated calls with the same path reuse the parsed
+    geometry instead of reading the file again. use pyogrio engine for
+    faster parsing.
+
+    [Arguments]
+    url_geometry : str
+        shapefile or geoJSON path
+    to_crs : str
+        coordinate reference system to reproject into, default None
+        means keep the file crs
+    '''
+    geometry = gpd.read_file(url_geometry, engine='pyogrio')
+    if to_crs is not None:
+        geometry = geometry.to_crs(to_crs)
+    return geometry
+
+
+@functools.lru_cache(maxsize=8)
+def _load_bounds(url_geometry):
+    '''
+    bounding box of every feature in url_geometry as (N, 4) array of
+    minx, miny, maxx, maxy. cached alongside _load_geom so the boxes
+    are computed once per file.
+
+    [Arguments]
+    url_geometry : str
+        shapefile or geoJSON path
+    '''
+    return _load_geom(url_geometry).geometry.bounds.values
+
+
+@functools.lru_cache(maxsize=8)
+def _load_land_tree(url_geometry):
+    '''
+    STRtree spatial index over the land features in url_geometry,
+    cached so batch point in polygon queries reuse the same tree.
+
+    [Arguments]
+    url_geometry : str
+        shapefile or geoJSON path
+    '''
+    return shapely.STRtree(_load_geom(url_geometry).geometry.values)
+
+
+def reproject_file(url_geometry, url_output, to_crs='EPSG:4326'):
+    '''
+    one time preprocessing helper that rewrites url_geometry into
+    url_output already reprojected, so the runtime to_crs call becomes
+    a no-op when the rewritten file is used instead.
+
+    [Arguments]
+    url_geometry : str
+        source shapefile or geoJSON path
+    url_output : str
+        destination path for the reprojected file
+    to_crs : str
+        coordinate reference system to reproject into, default
+        EPSG:4326
+    '''
+    pyogrio.write_dataframe(
+        gpd.read_file(url_geometry, engine='pyogrio').to_crs(to_crs), url_output)
+
+
+FaultData = namedtuple('FaultData', ['meta', 'coords', 'offsets'])
+
+
+def _cache_paths(url_geometry):
+    '''
+    paths of the binary cache files that sit next to url_geometry, as
+    (coords, offsets, meta) tuple.
+
+    [Arguments]
+    url_geometry : str
+        shapefile or geoJSON path
+    '''
+    return (f'{url_geometry}.coords.npy', f'{url_geometry}.offsets.npy',
+        f'{url_geometry}.meta.pkl')
+
+
+def _build_cache(url_geometry):
+    '''
+    one time preprocessing helper that parses the fault file and
+    persists the extracted vertex arrays and metadata next to it, so
+    later processes can memory map them and skip the shapefile or
+    geoJSON parse entirely on startup.
+
+    [Arguments]
+    url_geometry : str
+        shapefile or geoJSON path
+    '''
+    fault = _parse_fault(url_geometry)
+    coords_path, offsets_path, meta_path = _cache_paths(url_geometry)
+    np.save(coords_path, fault.coords)
+    np.save(offsets_path, fault.offsets)
+    fault.meta.to_pickle(meta_path)
+
+
+def _parse_fault(url_geometry):
+    '''
+    parse the fault file into FaultData. meta is the feature metadata
+    dataframe without geometry, coords is a contiguous (N, 2) float64
+    array of every densified vertex longitude, latitude, and offsets
+    marks where feature i vertices start and end inside coords as
+    coords[offsets[i]:offsets[i+1]]. distance kernels consume coords
+    and offsets directly without touching geometry objects.
+
+    [Arguments]
+    url_geometry : str
+        shapefile or geoJSON path
+    '''
+    gdf = _load_geom(url_geometry, to_crs='EPSG:4326')
+    geoms = gdf.geometry.values
+    '''densify the lines before extracting vertices so the vertex
+    spacing stays below ~2 Km at the equator; the point to vertex
+    kernel then cannot undershoot the true line distance by more than
+    that, well inside the 16 Km threshold of determine_eq_source
+    '''
+    dense_geoms = shapely.segmentize(geoms, max_segment_length=0.02)
+    coords = shapely.get_coordinates(dense_geoms).astype(np.float64)
+    offsets = np.concatenate(([0], np.cumsum(shapely.get_num_coordinates(dense_geoms))))
+    return FaultData(pd.DataFrame(gdf.drop(columns='geometry')), coords, offsets)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_fault(url_geometry):
+    '''
+    fault geometry from url_geometry bundled as FaultData, cached so
+    everything is built once per process. when the binary cache files
+    written by _build_cache exist and are newer than the source file,
+    the vertex arrays are memory mapped directly and the parse is
+    skipped; otherwise the source file is parsed as usual.
+
+    [Arguments]
+    url_geometry : str
+        shapefile or geoJSON path
+    '''
+    coords_path, offsets_path, meta_path = _cache_paths(url_geometry)
+    source_mtime = os.path.getmtime(url_geometry)
+    if all(os.path.exists(p) and os.path.getmtime(p) > source_mtime
+            for p in (coords_path, offsets_path, meta_path)):
+        return FaultData(pd.read_pickle(meta_path),
+            np.load(coords_path, mmap_mode='r'),
+            np.load(offsets_path, mmap_mode='r'))
+    return _parse_fault(url_geometry)
+
+
+def classify(is_inland, depth, distance, segment_name):
+    '''
+    classify arrays of earthquake events into source names without any
+    per element branching, following the same conditions as
+    determine_eq_source : depth above 50 Km is subduction, inland
+    events further than 16 Km from the nearest segment are local
+    fault, anything else takes the nearest segment name.
+
+    [Arguments]
+    is_inland : array
+        boolean value per event, True when epicenter is in land
+    depth : array
+        earthquake depth per event in Km
+    distance : array
+        distance to nearest fault segment per event in Km
+    segment_name : array
+        nearest fault segment name per event
+    '''
+    is_inland = np.asarray(is_inland, dtype=bool)
+    depth = np.asarray(depth, dtype=np.float64)
+    distance = np.asarray(distance, dtype=np.float64)
+    segment_name = np.asarray(segment_name, dtype=object)
+    return np.where(depth > 50, 'zona subduksi',
+        np.where(is_inland & (distance >= 16), 'Sesar Lokal', segment_name))
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def _nearest_fault(latitude, longitude, coords, offsets):
+    '''
+    compiled kernel that computes haversine distance in Km from a
+    coordinate point to every fault vertex and keeps a running minimum
+    per feature, returning the index of the nearest feature and its
+    distance. prange spreads the features over all cores, the jit cost
+    is paid once per process.
+
+    [Arguments]
+    latitude : float
+        latitude of coordinate point
+    longitude : float
+        longitude of coordinate point
+    coords : array
+        (N, 2) float64 array of vertex longitude, latitude in degree
+    offsets : array
+        index where feature i vertices start and end inside coords as
+        coords[offsets[i]:offsets[i+1]]
+    '''
+    lat_p = math.radians(latitude)
+    lon_p = math.radians(longitude)
+    cos_lat_p = math.cos(lat_p)
+    n_feature = offsets.shape[0] - 1
+    distance = np.empty(n_feature)
+    for i in prange(n_feature):
+        best = np.inf
+        for j in range(offsets[i], offsets[i+1]):
+            lat_v = math.radians(coords[j, 1])
+            lon_v = math.radians(coords[j, 0])
+            a = math.sin((lat_v - lat_p) / 2) ** 2 \
+                + cos_lat_p * math.cos(lat_v) * math.sin((lon_v - lon_p) / 2) ** 2
+            d = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+            if d < best:
+                best = d
+        distance[i] = best
+    idx = np.argmin(distance)
+    return idx, distance[idx]
+
+
+@njit(fastmath=True, cache=True)
+def _nearest_fault_serial(latitude, longitude, coords, offsets):
+    '''
+    serial twin of _nearest_fault for process_batch workers : there
+    the threads are already the parallelism unit, and the default
+    numba workqueue threading layer aborts the process when a parallel
+    kernel is entered from several threads at once. the body is kept
+    as its own def rather than compiled from a shared function object
+    because the numba on disk cache keys ignore compilation flags, so
+    two variants of one function would overwrite each other's cache
+    entry and resurrect the parallel machine code here.
+
+    [Arguments]
+    latitude : float
+        latitude of coordinate point
+    longitude : float
+        longitude of coordinate point
+    coords : array
+        (N, 2) float64 array of vertex longitude, latitude in degree
+    offsets : array
+        index where feature i vertices start and end inside coords as
+        coords[offsets[i]:offsets[i+1]]
+    '''
+    lat_p = math.radians(latitude)
+    lon_p = math.radians(longitude)
+    cos_lat_p = math.cos(lat_p)
+    n_feature = offsets.shape[0] - 1
+    distance = np.empty(n_feature)
+    for i in range(n_feature):
+        best = np.inf
+        for j in range(offsets[i], offsets[i+1]):
+            lat_v = math.radians(coords[j, 1])
+            lon_v = math.radians(coords[j, 0])
+            a = math.sin((lat_v - lat_p) / 2) ** 2 \
+                + cos_lat_p * math.cos(lat_v) * math.sin((lon_v - lon_p) / 2) ** 2
+            d = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+            if d < best:
+                best = d
+        distance[i] = best
+    idx = np.argmin(distance)
+    return idx, distance[idx]
+
 __author__ = 'Shandy Yogaswara'
 __version_info__ = (2024, 1, 'aN (Alpha Release)')
 __version__ = ".".join(map(str, __version_info__))
 
+def _classify_event(latitude, longitude, depth, land_geometry, land_bounds, fault):
+    '''
+    stateless per event worker used by process_batch. reads only the
+    shared cached geometry, never writes to it, so it is safe to run
+    from many threads at once; the GEOS contains call releases the GIL
+    while it works.
+
+    [Arguments]
+    latitude : float
+        latitude of earthquake epicenter
+    longitude : float
+        longitude of earthquake epicenter
+    depth : float
+        earthquake depth in Km
+    land_geometry : object
+        cached land geodataframe
+    land_bounds : array
+        cached (N, 4) bounding box array of land_geometry
+    fault : FaultData
+        cached fault geometry bundle
+    '''
+    eq_point = Point(longitude, latitude)
+    mask = (land_bounds[:,0] <= longitude) & (land_bounds[:,2] >= longitude) \
+        & (land_bounds[:,1] <= latitude) & (land_bounds[:,3] >= latitude)
+    inland = bool(
+        shapely.contains(land_geometry.geometry.values[mask], eq_point).any())
+    idx, distance = _nearest_fault_serial(latitude, longitude, fault.coords, fault.offsets)
+    segment_name = classify([inland], [depth], [distance],
+        [fault.meta['Segment'].values[int(idx)]])[0]
+    return 'darat' if inland else 'laut', distance, segment_name
+
+
 class EqSourceDeterminator:
     '''
     Class used to determine the source of earthquake. the fault based on
@@ -49,9 +363,18 @@ class EqSourceDeterminator:
         determine nearest distance from coordinate point to fault
         geometry
     determine_eq_source
-        conclude the earthquake source based on is_inland, 
+        conclude the earthquake source based on is_inland,
         distance_to_fault, and earthquake parameters
-    
+    run
+        run the whole pipeline in order, skipping the fault distance
+        computation for deep events
+    batch
+        process arrays of earthquake events at once against the same
+        cached geometry
+    process_batch
+        classify many event records in parallel threads against the
+        same cached geometry
+
     '''
     def __init__(self,latitude,longitude,depth,*url_geometry):
         '''
@@ -68,6 +391,10 @@ class EqSourceDeterminator:
         '''
         self.latitude, self.longitude, self.depth = latitude, longitude, depth
         self.url_geometry = url_geometry
+        self._is_inland = None
+        self._nearest_segment = None
+        self._nearest_distance_km = None
+        self._nearest_segment_name = None
 
     def is_inland(self,latitude=None,longitude=None,url_geometry=None):
         '''
@@ -98,9 +425,10 @@ class EqSourceDeterminator:
             shapefile from url_geometry object that geopandas read
         eq_point : object
             earthquake coordinate as point geometry
-        is_inland : bool
+        _is_inland : bool
             boolean value corresponding to earthquake location in land
-            or not
+            or not, stored on the instance and also returned so the
+            method can be called again with other arguments
 
         [Raises]
         ValueError
@@ -121,11 +449,16 @@ class EqSourceDeterminator:
         latitude = self.latitude if latitude is None else latitude
         longitude = self.longitude if longitude is None else longitude
         
-        land_geometry = gpd.read_file(url_geometry)
+        land_geometry = _load_geom(url_geometry)
 
         eq_point = Point(longitude, latitude)
 
-        self.is_inland = land_geometry.contains(eq_point).any()
+        bounds = _load_bounds(url_geometry)
+        mask = (bounds[:,0] <= longitude) & (bounds[:,2] >= longitude) \
+            & (bounds[:,1] <= latitude) & (bounds[:,3] >= latitude)
+        self._is_inland = bool(
+            shapely.contains(land_geometry.geometry.values[mask], eq_point).any())
+        return self._is_inland
 
     def distance_to_fault(self,latitude=None,longitude=None,url_geometry=None):
         '''
@@ -152,17 +485,13 @@ class EqSourceDeterminator:
         url_geometry : str
             fault geometry shapefile path, default use the 2nd initial
             arguments
-        fault_geometry : object
-            shapefile from url_geometry object that geopandas read
-        eq_point : object
-            earthquake coordinate as point geometry
-        distance_to_fault : dataframe
-            altered fault_geometry dataframe by adding distance between
-            eq_point and each elements of fault_geometry in Km.
+        fault : FaultData
+            cached fault geometry bundle with the feature metadata
+            frame plus vertex coordinate arrays and offsets
         nearest_to_fault : dataframe
-            distance_to_fault row where the Distance have the minimum
-            value, consist of Id, Segment,type, maximum magnitude, slip 
-            rate, and distance to epicenter in Km
+            single row for the fault feature nearest to the epicenter,
+            consist of Segment, type, maximum magnitude, slip rate,
+            and distance to epicenter in Km
 
         [Raises]
         ValueError
@@ -191,13 +520,15 @@ class EqSourceDeterminator:
         if not isinstance(longitude, float):
             raise TypeError(f'{longitude} type is not float, but {type(longitude)} instead')
         
-        fault_geometry = gpd.read_file(url_geometry).to_crs('EPSG:4326')
+        fault = _load_fault(url_geometry)
 
-        eq_point = Point(longitude, latitude)
-
-        fault_geometry['Distance']  = [111.18 * eq_point.distance(line) for line in fault_geometry.geometry]
-        self.distance_to_fault = fault_geometry.drop(['Id','Name','LCLASSSTR','geometry'],axis=1)
-        self.nearest_segment = self.distance_to_fault.loc[self.distance_to_fault['Distance'] == self.distance_to_fault['Distance'].min()]
+        idx, distance = _nearest_fault(latitude, longitude, fault.coords, fault.offsets)
+        idx = int(idx)
+        self._nearest_segment = fault.meta.iloc[[idx]][
+            ['Segment','Type','Mmax_d','Sliprate_1']].assign(Distance=distance)
+        self._nearest_distance_km = float(distance)
+        self._nearest_segment_name = self._nearest_segment['Segment'].iat[0]
+        return self._nearest_segment
 
     def determine_eq_source(self,is_inland=None,nearest_segment=None,depth=None):
         '''
@@ -229,53 +560,152 @@ class EqSourceDeterminator:
             if the type of data doesnt match with requirements
         '''
         
-        if is_inland is None and self.is_inland is None:
+        if is_inland is None and self._is_inland is None:
             raise ValueError('Cant determine if earthquake is in land or not')
-        if nearest_segment is None and self.nearest_segment is None:
+        if nearest_segment is None and self._nearest_segment is None:
             raise ValueError('No segment found, please check the fault shapefile and re run from beginning')
         if depth is None and self.depth is None:
             raise ValueError('Missing earthquake parameter : Depth')
 
-        nearest_segment = self.nearest_segment if nearest_segment is None else nearest_segment
+        if nearest_segment is None:
+            distance = self._nearest_distance_km
+            segment_name = self._nearest_segment_name
+        else:
+            distance = float(nearest_segment.Distance.iat[0])
+            segment_name = nearest_segment.Segment.iat[0]
 
         depth = self.depth if depth is None else depth
-        if isinstance(depth,int) or isinstance(depth,float):
-            '''if depth variable type is int or float, check depth value. if its
-            more than 50, set segment_name as subduction zone, else set as None
-            '''
-            if depth > 50:
-                self.segment_name = 'zona subduksi'
-            else:
-                self.segment_name = None
-        else:
+        if not (isinstance(depth,int) or isinstance(depth,float)):
             raise TypeError(f'depth type error, should be int, but instead {type(depth)}')
 
-        is_inland = self.is_inland if is_inland is None else is_inland
-        if isinstance(is_inland, bool) or isinstance(is_inland, np.bool_):
-            '''if is_inland is boolean or numpy boolean, check is_inland value.
-            if True, set is_inland as land and check segment_name. if None,
-            check nearest_segment.Distance value. if its less than 16, set
-            nearest_segment.Segment values as segment_name, if not, set as Local
-            Fault instead. if is_inland is false, set is_inland as sea and
-            check segment_name. if None, set nearest_segment.Segment values as
-            segment_name. take caution if segment_name somehow is a fault segment
-            at land, user comprehensive understanding about geology settings
-            is needed.
-            '''
-            if is_inland:
-                self.is_inland = 'darat'
-                if self.segment_name is None:
-                    if nearest_segment.Distance.values < 16:
-                        self.segment_name = nearest_segment.Segment.values[0]
-                    else:
-                        self.segment_name = 'Sesar Lokal'
-            elif not is_inland:
-                self.is_inland = 'laut'
-                if self.segment_name is None:
-                    self.segment_name = nearest_segment.Segment.values[0]
-        else:
+        is_inland = self._is_inland if is_inland is None else is_inland
+        if not (isinstance(is_inland, bool) or isinstance(is_inland, np.bool_)):
             raise TypeError(f'is_inland type error, should be boolean, but instead {type(is_inland)}')
 
+        '''the classification itself is the branchless array expression
+        shared with the batch path, called here with length 1 arrays.
+        take caution if segment_name somehow is a fault segment at
+        land, user comprehensive understanding about geology settings
+        is needed.
+        '''
+        self.segment_name = classify(
+            [is_inland], [depth], [distance], [segment_name])[0]
+        self.inland_label = 'darat' if is_inland else 'laut'
+
+    def run(self):
+        '''
+        run is_inland, distance_to_fault, and determine_eq_source in
+        order using the initial arguments. any event deeper than 50 Km
+        is classified as subduction no matter where the nearest fault
+        is, so the whole fault distance computation is skipped for
+        those and _nearest_segment stays None.
+
+        [Returns]
+        segment_name after the pipeline finished
+        '''
+        self.is_inland()
+        if self.depth > 50:
+            self.inland_label = 'darat' if self._is_inland else 'laut'
+            self.segment_name = 'zona subduksi'
+            return self.segment_name
+        self.distance_to_fault()
+        self.determine_eq_source()
+        return self.segment_name
+
+    @classmethod
+    def batch(cls,latitudes,longitudes,depths,*url_geometry):
+        '''
+        process arrays of earthquake events at once. epicenter points
+        are constructed in bulk with shapely.points, the land check is
+        a single spatial index query over all points, and the nearest
+        fault lookup reuses the compiled kernel against the cached
+        coordinate arrays.
+
+        [Arguments]
+        latitudes : array
+            latitude of each earthquake epicenter
+        longitudes : array
+            longitude of each earthquake epicenter
+        depths : array
+            depth of each earthquake in Km
+        url_geometry : str, list
+            list of shapefile path that contain land geometry and fault
+            geometry as arguments sequentially
+
+        [Returns]
+        dataframe with one row per event containing latitude,
+        longitude, depth, is_inland, Distance, and segment_name,
+        following the same conditions as determine_eq_source
+        '''
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        depths = np.asarray(depths, dtype=np.float64)
+
+        eq_points = shapely.points(longitudes, latitudes)
+
+        inland = np.zeros(eq_points.shape[0], dtype=bool)
+        inland[_load_land_tree(url_geometry[0]).query(eq_points, predicate='within')[0]] = True
+
+        fault = _load_fault(url_geometry[1])
+        segments = fault.meta['Segment'].values
+
+        n_event = latitudes.shape[0]
+        idxs = np.empty(n_event, dtype=np.int64)
+        distances = np.empty(n_event, dtype=np.float64)
+        for i in range(n_event):
+            idxs[i], distances[i] = _nearest_fault(
+                latitudes[i], longitudes[i], fault.coords, fault.offsets)
+
+        segment_names = classify(inland, depths, distances, segments[idxs])
+
+        return pd.DataFrame({
+            'latitude': latitudes, 'longitude': longitudes, 'depth': depths,
+            'is_inland': np.where(inland, 'darat', 'laut'),
+            'Distance': distances, 'segment_name': segment_names})
+
+    @classmethod
+    def process_batch(cls,records,land_geometry_url,fault_geometry_url,max_workers=None):
+        '''
+        classify many earthquake records in parallel threads. the land
+        and fault geometry are loaded once through the cache, then each
+        record is handed to a stateless worker; since the heavy GEOS
+        work drops the GIL, throughput scales with cores without the
+        pickling cost of multiprocessing.
+
+        [Arguments]
+        records : list
+            list of (latitude, longitude, depth) per event
+        land_geometry_url : str
+            land geometry shapefile path
+        fault_geometry_url : str
+            fault geometry shapefile path
+        max_workers : int
+            thread count, default lets ThreadPoolExecutor decide
+
+        [Returns]
+        dataframe with one row per event, same columns as batch
+        '''
+        records = list(records)
+        if not records:
+            return pd.DataFrame(columns=[
+                'latitude','longitude','depth','is_inland','Distance','segment_name'])
+
+        land_geometry = _load_geom(land_geometry_url)
+        land_bounds = _load_bounds(land_geometry_url)
+        fault = _load_fault(fault_geometry_url)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(
+                lambda record: _classify_event(
+                    record[0], record[1], record[2],
+                    land_geometry, land_bounds, fault),
+                records))
+
+        frame = pd.DataFrame(records, columns=['latitude','longitude','depth'])
+        frame[['is_inland','Distance','segment_name']] = pd.DataFrame(
+            results, index=frame.index)
+        return frame
+
 
 if __name__ == '__main__':
     land_geometry = r"D:\ProjectPy\AutoNarasi\flaskr_\static\shapefile\land_geometry\indo_provinces.shp"
@@ -289,8 +719,6 @@ if __name__ == '__main__':
     mag = 2.9
 
     EqSource = EqSourceDeterminator(latitude, longitude, depth, land_geometry, fault_geometry2)
-    EqSource.is_inland()
-    EqSource.distance_to_fault()
-    EqSource.determine_eq_source()
-    print(f'gempa terletak di {EqSource.is_inland} dengan segmen patahan di {EqSource.segment_name}')
+    EqSource.run()
+    print(f'gempa terletak di {EqSource.inland_label} dengan segmen patahan di {EqSource.segment_name}')
     